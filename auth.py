@@ -5,10 +5,16 @@ Using bcrypt directly instead of passlib for compatibility.
 """
 
 import os
+import time
+import queue
+import hashlib
 import sqlite3
+import threading
 import bcrypt
-from datetime import datetime, timedelta
-from typing import Optional
+from contextlib import contextmanager
+from functools import cache
+from datetime import timedelta
+from typing import Any, NamedTuple, Optional
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
@@ -20,6 +26,14 @@ SECRET_KEY = os.getenv("SECRET_KEY", "techgear-secret-key-change-in-production-2
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 DATABASE_PATH = "users.db"
+DB_POOL_SIZE = 4
+DB_MMAP_SIZE = 256 * 1024 * 1024  # 256 MB
+BCRYPT_TARGET_SECONDS = 0.25  # Slowest acceptable hash time per login
+BCRYPT_MIN_COST = 12  # bcrypt.gensalt() default; calibration only ever raises it
+BCRYPT_MAX_COST = 14
+TOKEN_CACHE_MAX_SIZE = 10_000
+USER_CACHE_MAX_SIZE = 5000
+USER_CACHE_TTL_SECONDS = 60
 
 
 # ============================================================================
@@ -61,62 +75,229 @@ class User(BaseModel):
     created_at: str
 
 
+# ============================================================================
+# Cache Helpers
+# ============================================================================
+
+class _CacheEntry(NamedTuple):
+    """A cached value with its absolute expiry (UNIX seconds)."""
+    expires_at: float
+    value: Any
+
+
+# Validated tokens: blake2b(token) -> _CacheEntry(exp claim, TokenData).
+# The key is derived from the full token, signature included, so a hit means
+# the signature was already verified and only the expiry needs re-checking.
+_token_cache: dict = {}
+
+# Public user fields looked up by email: email -> _CacheEntry(expires_at, user dict)
+_user_cache: dict = {}
+
+
+def _cache_get(cache: dict, key):
+    """Return a cached value, or None if missing or expired."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry.expires_at <= time.time():
+        cache.pop(key, None)
+        return None
+    return entry.value
+
+
+def _cache_set(cache: dict, key, value, expires_at: float, max_size: int):
+    """Store a value until expires_at, evicting the oldest entry when full."""
+    if key not in cache and len(cache) >= max_size:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = _CacheEntry(expires_at, value)
+
+
+# ============================================================================
+# Password Hashing
+# ============================================================================
+
+def _calibrate_bcrypt_cost() -> int:
+    """
+    Pick the highest bcrypt cost whose hash time stays within target,
+    never going below BCRYPT_MIN_COST. Each cost step doubles the work, so one timing per cost is enough and
+    the search stops as soon as the next step would overshoot the target.
+    """
+    best_cost = BCRYPT_MIN_COST
+    for cost in range(BCRYPT_MIN_COST, BCRYPT_MAX_COST + 1):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"x" * 16, bcrypt.gensalt(cost))
+        elapsed = time.perf_counter() - start
+        if elapsed > BCRYPT_TARGET_SECONDS:
+            break
+        best_cost = cost
+        if elapsed * 2 > BCRYPT_TARGET_SECONDS:
+            break
+    return best_cost
+
+
+# Set BCRYPT_COST to pin the cost and skip calibration at startup
+BCRYPT_COST = int(os.getenv("BCRYPT_COST", "0")) or _calibrate_bcrypt_cost()
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the calibrated bcrypt cost."""
+    password_bytes = password.encode('utf-8')
+    salt = bcrypt.gensalt(BCRYPT_COST)
+    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+
+
+@cache
+def _dummy_hash() -> bytes:
+    """
+    Get the hash checked against when the email is unknown, so every login
+    pays one bcrypt check. Built on first use to keep it off the import path,
+    at the highest cost of any stored hash: accounts created before a cost
+    change keep their old cost until they log in, and a cheaper dummy check
+    would let response times reveal which emails exist.
+    """
+    cost = max(BCRYPT_COST, BCRYPT_MIN_COST, get_max_hash_cost())
+    return bcrypt.hashpw(b"x", bcrypt.gensalt(cost))
+
+
+def _hash_cost(password_hash: str) -> int:
+    """Read the cost factor from a stored "$2b$12$..." bcrypt hash."""
+    return int(password_hash[4:6])
+
+
+# ============================================================================
+# Connection Pool
+# ============================================================================
+
+_pool: Optional[queue.Queue] = None
+_pool_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a long-lived, autocommit SQLite connection for the pool."""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-8000")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _get_pool() -> queue.Queue:
+    """Get the connection pool, opening the connections on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = queue.Queue(maxsize=DB_POOL_SIZE)
+                for _ in range(DB_POOL_SIZE):
+                    pool.put(_connect())
+                _pool = pool
+    return _pool
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection and return it to the pool afterwards."""
+    pool = _get_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+
 # ============================================================================
 # Database Functions
 # ============================================================================
 
+_initialized = False
+
+
 def init_database():
-    """Initialize the SQLite database with users table."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
+    """Initialize the SQLite database with users table (once per process)."""
+    global _initialized
+    if _initialized:
+        return
+    
+    with get_conn() as conn:
+        # WAL mode is persistent, so it only needs to be set on the database once
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    _initialized = True
 
 
 def get_user_by_email(email: str) -> Optional[dict]:
-    """Get user from database by email."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, email, name, password_hash, created_at FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-    conn.close()
+    """Get user from database by email, including the password hash."""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT id, email, name, password_hash, created_at FROM users WHERE email = ?",
+            (email,)
+        ).fetchone()
+    
+    return dict(row) if row else None
+
+
+def get_max_hash_cost() -> int:
+    """Get the highest bcrypt cost among stored password hashes (0 if there are none)."""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT MAX(CAST(substr(password_hash, 5, 2) AS INTEGER)) FROM users"
+        ).fetchone()
+    
+    return row[0] or 0
+
+
+def get_user_for_auth(email: str) -> Optional[dict]:
+    """
+    Get the public fields of a user by email (no password hash).
+    Used on every authenticated request, so results are cached briefly.
+    """
+    cached = _cache_get(_user_cache, email)
+    if cached is not None:
+        return cached
+    
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT id, email, name, created_at FROM users WHERE email = ?",
+            (email,)
+        ).fetchone()
     
     if row:
-        return {
-            "id": row[0],
-            "email": row[1],
-            "name": row[2],
-            "password_hash": row[3],
-            "created_at": row[4]
-        }
+        user = dict(row)
+        _cache_set(_user_cache, email, user, time.time() + USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
+        return user
     return None
 
 
 def create_user(email: str, name: str, password: str) -> dict:
     """Create a new user in the database."""
-    # Hash password using bcrypt directly
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
-    
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (email, name, password_hash) VALUES (?, ?, ?)",
-        (email, name, password_hash)
-    )
-    conn.commit()
-    user_id = cursor.lastrowid
-    conn.close()
+    password_hash = hash_password(password)
+    
+    with get_conn() as conn:
+        # Take the write lock up front instead of upgrading mid-transaction
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO users (email, name, password_hash) VALUES (?, ?, ?)",
+                (email, name, password_hash)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        user_id = cursor.lastrowid
+    
+    # Only found users are cached, but drop any entry so the next lookup sees the new row
+    _user_cache.pop(email, None)
     
     return {
         "id": user_id,
@@ -125,6 +306,15 @@ def create_user(email: str, name: str, password: str) -> dict:
     }
 
 
+def update_password_hash(user_id: int, password_hash: str):
+    """Replace a user's stored password hash."""
+    with get_conn() as conn:
+        conn.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?",
+            (password_hash, user_id)
+        )
+
+
 # ============================================================================
 # Authentication Functions
 # ============================================================================
@@ -140,10 +330,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """Create a JWT access token."""
     to_encode = data.copy()
     
+    # exp as an integer UNIX timestamp avoids datetime arithmetic per token
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -151,7 +342,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_token(token: str) -> Optional[TokenData]:
-    """Decode and validate a JWT token."""
+    """
+    Decode and validate a JWT token.
+    Tokens that already passed verification are served from a cache
+    until their expiry: a repeat request costs a hash, a dict lookup and
+    an exp comparison, with no HMAC, base64 or JSON work.
+    """
+    cache_key = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+    cached = _cache_get(_token_cache, cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -160,9 +361,15 @@ def decode_token(token: str) -> Optional[TokenData]:
         if email is None:
             return None
             
-        return TokenData(email=email, user_id=user_id)
+        token_data = TokenData(email=email, user_id=user_id)
     except JWTError:
         return None
+    
+    # Never keep a token around past its own expiry
+    now = time.time()
+    expires_at = min(payload.get("exp", now), now + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    _cache_set(_token_cache, cache_key, token_data, expires_at, TOKEN_CACHE_MAX_SIZE)
+    return token_data
 
 
 def authenticate_user(email: str, password: str) -> Optional[dict]:
@@ -170,11 +377,18 @@ def authenticate_user(email: str, password: str) -> Optional[dict]:
     user = get_user_by_email(email)
     
     if not user:
+        # Same cost as a wrong password: no timing signal for unknown emails
+        bcrypt.checkpw(password.encode('utf-8'), _dummy_hash())
         return None
     
     if not verify_password(password, user["password_hash"]):
         return None
     
+    # Upgrade hashes created with a lower cost than the current one
+    if _hash_cost(user["password_hash"]) < BCRYPT_COST:
+        user["password_hash"] = hash_password(password)
+        update_password_hash(user["id"], user["password_hash"])
+    
     return user
 
 
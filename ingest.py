@@ -5,12 +5,24 @@ creates embeddings, and stores them in ChromaDB.
 """
 
 import os
+import re
+import uuid
+import queue
+import threading
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter
 from dotenv import load_dotenv
+from langchain_core.documents import Document
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 
+from rag_chain import (
+    COLLECTION_METADATA, RESPONSE_CACHE_COLLECTION, chroma_client_settings,
+    create_chroma_client, create_embeddings as create_rag_embeddings
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -18,6 +30,14 @@ load_dotenv()
 DATA_PATH = "data/product_info.txt"
 CHROMA_PATH = "chroma_db"
 COLLECTION_NAME = "techgear_products"
+EMBED_BATCH_SIZE = 100  # Max texts per Gemini batchEmbedContents request
+EMBED_WORKERS = 8       # Concurrent embedding requests
+PIPELINE_QUEUE_SIZE = 4  # Batches buffered between pipeline stages
+READ_WINDOW_SIZE = 2 ** 20  # Characters read from the source file at a time
+SPLIT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+_get_content = attrgetter("page_content")
+_get_metadata = attrgetter("metadata")
 
 
 def load_documents(file_path: str):
@@ -29,46 +49,218 @@ def load_documents(file_path: str):
     return documents
 
 
-def split_documents(documents, chunk_size: int = 1000, chunk_overlap: int = 200):
-    """Split documents into smaller chunks for better retrieval."""
-    print(f"Splitting documents (chunk_size={chunk_size}, overlap={chunk_overlap})...")
-    text_splitter = RecursiveCharacterTextSplitter(
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    """Get a shared text splitter for the given chunking settings."""
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len,
-        separators=["\n\n", "\n", " ", ""]
+        separators=SPLIT_SEPARATORS
     )
+
+
+def split_documents(documents, chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Split documents into smaller chunks for better retrieval."""
+    print(f"Splitting documents (chunk_size={chunk_size}, overlap={chunk_overlap})...")
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
     chunks = text_splitter.split_documents(documents)
     print(f"Created {len(chunks)} chunks.")
     return chunks
 
 
+def _split_settled(
+    text_splitter: RecursiveCharacterTextSplitter,
+    text: str,
+    chunk_size: int,
+) -> tuple[list[str], str]:
+    """
+    Split the part of a buffer whose chunks no longer depend on later text.
+    Returns (chunks, rest), where rest is raw text to carry into the next
+    window. The splitter works on paragraphs (split on the first separator,
+    which stays attached to the following paragraph), merging runs of short
+    ones and splitting long ones on their own. So the buffer is cut at its
+    last paragraph break, and the carried text restarts where a whole-file
+    split would start a fresh chunk: after a long paragraph, or at the first
+    paragraph of the last chunk merged from short ones.
+    """
+    breaks = [m.start() for m in re.finditer(re.escape(SPLIT_SEPARATORS[0]), text)]
+    # The head must itself contain a break, or it would be split on a finer separator
+    if len(breaks) < 2:
+        return [], text
+    cut = breaks[-1]
+    starts = sorted({0, *breaks[:-1]})
+    paragraphs = list(zip(starts, starts[1:] + [cut]))
+    pieces = text_splitter.split_text(text[:cut])
+    
+    def is_long(index: int) -> bool:
+        start, end = paragraphs[index]
+        return end - start >= chunk_size
+    
+    if is_long(-1):
+        return pieces, text[cut:]
+    
+    run_start = len(paragraphs) - 1
+    while run_start > 0 and not is_long(run_start - 1):
+        run_start -= 1
+    
+    # Latest paragraph that starts one of the trailing chunks. A whitespace-only
+    # paragraph before it may or may not belong to that chunk, so skip those.
+    for index in range(len(paragraphs) - 1, run_start - 1, -1):
+        if index > run_start and not text[slice(*paragraphs[index - 1])].strip():
+            continue
+        start = paragraphs[index][0]
+        tail = text_splitter.split_text(text[start:cut])
+        if index == run_start or (tail and pieces[-len(tail):] == tail):
+            return pieces[:len(pieces) - len(tail)], text[start:]
+
+
+def stream_chunks(
+    file_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    window_size: int = READ_WINDOW_SIZE,
+):
+    """
+    Lazily split a text file into chunks without loading it whole.
+    The file is read in window_size windows and each window's unsettled tail
+    is carried into the next one (see _split_settled), so the chunks are the
+    same as splitting the whole file at once.
+    """
+    print(f"Streaming chunks from {file_path} (chunk_size={chunk_size}, overlap={chunk_overlap})...")
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    metadata = {"source": file_path}
+    carry = ""
+    
+    with open(file_path, "r", encoding="utf-8", buffering=window_size) as f:
+        while window := f.read(window_size):
+            pieces, carry = _split_settled(text_splitter, carry + window, chunk_size)
+            for piece in pieces:
+                yield Document(page_content=piece, metadata=dict(metadata))
+    
+    for piece in text_splitter.split_text(carry):
+        yield Document(page_content=piece, metadata=dict(metadata))
+
+
+def check_stream_chunks(file_path: str, window_size: int = 4096) -> bool:
+    """Check that streaming in small windows gives the same chunks as a whole-file split."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        expected = get_text_splitter().split_text(f.read())
+    streamed = [doc.page_content for doc in stream_chunks(file_path, window_size=window_size)]
+    return streamed == expected
+
+
+def _batched(iterable, size: int):
+    """Yield lists of up to size items from an iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
 def create_embeddings():
     """Create embedding function using Google Generative AI."""
     print("Initializing Google Generative AI Embeddings...")
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=os.getenv("GOOGLE_API_KEY")
-    )
+    # Same model and dimensionality as retrieval, or the vectors would not be comparable
+    embeddings = create_rag_embeddings(os.getenv("GOOGLE_API_KEY"))
     return embeddings
 
 
 def store_in_chroma(chunks, embeddings, persist_directory: str, collection_name: str):
-    """Store document chunks in ChromaDB."""
-    print(f"Storing {len(chunks)} chunks in ChromaDB at {persist_directory}...")
+    """
+    Store document chunks (any iterable) in ChromaDB.
+    Runs as a pipeline so splitting, embedding and writing overlap: this
+    thread batches chunks, EMBED_WORKERS threads embed them, and a single
+    writer thread adds them to the collection.
+    """
+    print(f"Storing chunks in ChromaDB at {persist_directory}...")
     
     # Create Chroma vector store
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
+    vectorstore = Chroma(
+        client=create_chroma_client(),
+        client_settings=chroma_client_settings(),
         persist_directory=persist_directory,
-        collection_name=collection_name
+        embedding_function=embeddings,
+        collection_name=collection_name,
+        collection_metadata=COLLECTION_METADATA
     )
     
-    print(f"Successfully stored {len(chunks)} chunks in ChromaDB.")
+    embed_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    done = object()
+    errors = []
+    stored = 0
+    
+    def embed_worker():
+        # Keep draining after a failure so the producer never blocks
+        while (batch := embed_queue.get()) is not done:
+            if errors:
+                continue
+            try:
+                texts = list(map(_get_content, batch))
+                vectors = embeddings.embed_documents(texts)
+                write_queue.put((batch, texts, vectors))
+            except Exception as e:
+                errors.append(e)
+        write_queue.put(done)
+    
+    def write_worker():
+        nonlocal stored
+        finished = 0
+        while finished < EMBED_WORKERS:
+            item = write_queue.get()
+            if item is done:
+                finished += 1
+                continue
+            if errors:
+                continue
+            batch, texts, vectors = item
+            try:
+                vectorstore._collection.add(
+                    ids=[str(uuid.uuid4()) for _ in batch],
+                    embeddings=vectors,
+                    documents=texts,
+                    metadatas=list(map(_get_metadata, batch))
+                )
+                stored += len(batch)
+            except Exception as e:
+                errors.append(e)
+    
+    embed_threads = [threading.Thread(target=embed_worker, daemon=True) for _ in range(EMBED_WORKERS)]
+    writer = threading.Thread(target=write_worker, daemon=True)
+    for thread in embed_threads:
+        thread.start()
+    writer.start()
+    
+    try:
+        for batch in _batched(chunks, EMBED_BATCH_SIZE):
+            if errors:
+                break
+            embed_queue.put(batch)
+    finally:
+        for _ in embed_threads:
+            embed_queue.put(done)
+        writer.join()
+    
+    # Even a partial write changes what the chatbot should answer
+    clear_response_cache(vectorstore._client)
+    
+    if errors:
+        raise errors[0]
+    
+    print(f"Successfully stored {stored} chunks in ChromaDB.")
     return vectorstore
 
 
+def clear_response_cache(client):
+    """Drop cached chatbot answers, which may quote the old knowledge base."""
+    try:
+        client.delete_collection(RESPONSE_CACHE_COLLECTION)
+    except Exception:
+        # Not created yet: nothing to invalidate
+        return
+    print("Cleared the cached chatbot responses.")
+
+
 def main():
     """Main function to run the ingestion pipeline."""
     print("=" * 60)
@@ -87,15 +279,19 @@ def main():
         print(f"ERROR: Data file not found at {DATA_PATH}")
         return
     
+    # Sanity-check the streaming splitter while the file is small enough to load whole
+    if os.path.getsize(DATA_PATH) <= READ_WINDOW_SIZE and not check_stream_chunks(DATA_PATH):
+        print("ERROR: Streamed chunks differ from a whole-file split.")
+        return
+    
     # Run ingestion pipeline
-    documents = load_documents(DATA_PATH)
-    chunks = split_documents(documents)
+    chunks = stream_chunks(DATA_PATH)
     embeddings = create_embeddings()
     vectorstore = store_in_chroma(chunks, embeddings, CHROMA_PATH, COLLECTION_NAME)
     
     print("=" * 60)
     print("Ingestion complete!")
-    print(f"ChromaDB stored at: {CHROMA_PATH}")
+    print(f"ChromaDB stored at: {os.getenv('CHROMA_HOST') or CHROMA_PATH}")
     print("=" * 60)
     
     # Test retrieval
@@ -4,6 +4,8 @@ FastAPI application with authentication and chatbot endpoint.
 """
 
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Optional
 from dotenv import load_dotenv
@@ -11,14 +13,18 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from rag_agent import process_query, get_compiled_graph
+import rag_chain
+from rag_chain import warm_up_rag_chain
+from rag_agent import (
+    aprocess_query, astream_query, get_compiled_graph, get_classifier_chain
+)
 from auth import (
     UserCreate, UserLogin, Token, User,
     create_user, authenticate_user, create_access_token,
-    decode_token, get_user_by_email, init_database
+    decode_token, get_user_for_auth, init_database
 )
 
 # Load environment variables
@@ -27,6 +33,13 @@ load_dotenv()
 # Security
 security = HTTPBearer()
 
+# Warm up the RAG chain at startup (set RAG_WARMUP=0 to skip, e.g. in development)
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") != "0"
+RAG_WARMUP_TIMEOUT_SECONDS = 30
+
+# bcrypt releases the GIL, so password hashing runs in parallel off the event loop
+bcrypt_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="bcrypt")
+
 
 # ============================================================================
 # Pydantic Models for Request/Response
@@ -102,7 +115,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = get_user_by_email(token_data.email)
+    user = get_user_for_auth(token_data.email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -127,7 +140,7 @@ async def lifespan(app: FastAPI):
     print("✅ User database initialized.")
     
     # Check for API key
-    if not os.getenv("GOOGLE_API_KEY"):
+    if not rag_chain.GOOGLE_API_KEY:
         print("⚠️  WARNING: GOOGLE_API_KEY not found in environment variables.")
     else:
         print("✅ Google API key found.")
@@ -139,6 +152,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  WARNING: Could not compile workflow: {e}")
     
+    # Build the classifier client now rather than on the first request
+    try:
+        get_classifier_chain()
+        print("✅ Query classifier ready.")
+    except Exception as e:
+        print(f"⚠️  WARNING: Could not create query classifier: {e}")
+    
+    # Load the vector index and open Gemini connections before serving traffic
+    if RAG_WARMUP and rag_chain.GOOGLE_API_KEY:
+        try:
+            await asyncio.wait_for(asyncio.to_thread(warm_up_rag_chain), RAG_WARMUP_TIMEOUT_SECONDS)
+            print("✅ RAG chain warmed up.")
+        except Exception as e:
+            print(f"⚠️  WARNING: RAG chain warm-up failed: {e!r}")
+    
     print("✅ API is ready to accept requests.")
     print("📚 Swagger docs available at: http://localhost:8000/docs")
     print("🌐 Frontend available at: http://localhost:8000")
@@ -146,6 +174,7 @@ async def lifespan(app: FastAPI):
     yield
     
     print("👋 Shutting down TechGear Electronics Chatbot API...")
+    bcrypt_executor.shutdown(wait=False)
 
 
 # ============================================================================
@@ -241,15 +270,18 @@ async def signup(user_data: UserCreate):
     - **name**: User's full name
     """
     # Check if user already exists
-    existing_user = get_user_by_email(user_data.email)
+    existing_user = get_user_for_auth(user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create user
-    user = create_user(user_data.email, user_data.name, user_data.password)
+    # Create user (password hashing runs in the bcrypt thread pool)
+    loop = asyncio.get_running_loop()
+    user = await loop.run_in_executor(
+        bcrypt_executor, create_user, user_data.email, user_data.name, user_data.password
+    )
     
     # Generate token
     access_token = create_access_token(
@@ -277,7 +309,10 @@ async def login(user_data: UserLogin):
     - **email**: Registered email address
     - **password**: Account password
     """
-    user = authenticate_user(user_data.email, user_data.password)
+    loop = asyncio.get_running_loop()
+    user = await loop.run_in_executor(
+        bcrypt_executor, authenticate_user, user_data.email, user_data.password
+    )
     
     if not user:
         raise HTTPException(
@@ -341,13 +376,13 @@ async def chat(
     - **query**: The customer's question or message (1-1000 characters)
     """
     try:
-        if not os.getenv("GOOGLE_API_KEY"):
+        if not rag_chain.GOOGLE_API_KEY:
             raise HTTPException(
                 status_code=500,
                 detail="Google API key not configured."
             )
         
-        result = process_query(request.query)
+        result = await aprocess_query(request.query)
         
         return ChatResponse(
             response=result["response"],
@@ -364,6 +399,57 @@ async def chat(
         )
 
 
+@app.post(
+    "/chat/stream",
+    response_class=StreamingResponse,
+    responses={
+        200: {"description": "Response text streamed as it is generated", "content": {"text/plain": {}}},
+        401: {"description": "Unauthorized", "model": ErrorResponse},
+        500: {"description": "Internal server error", "model": ErrorResponse},
+    },
+    summary="Chat with streamed response (requires authentication)",
+    tags=["Chat"]
+)
+async def chat_stream(
+    request: ChatRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Process a customer query and stream the response text as it is generated.
+    
+    **Requires authentication** - Include Bearer token in Authorization header.
+    
+    The category is returned in the `X-Query-Category` header and the
+    escalation flag in `X-Needs-Escalation`.
+    
+    - **query**: The customer's question or message (1-1000 characters)
+    """
+    if not rag_chain.GOOGLE_API_KEY:
+        raise HTTPException(
+            status_code=500,
+            detail="Google API key not configured."
+        )
+    
+    # The first item is the classification, needed for the headers before any text
+    events = astream_query(request.query)
+    try:
+        classification = await anext(events)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred: {str(e)}"
+        )
+    
+    return StreamingResponse(
+        events,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "X-Query-Category": classification["category"],
+            "X-Needs-Escalation": str(classification["needs_escalation"]).lower(),
+        }
+    )
+
+
 # ============================================================================
 # Run with: uvicorn main:app --reload
 # ============================================================================
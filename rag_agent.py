@@ -4,16 +4,18 @@ This module implements the customer support workflow using LangGraph.
 Nodes: Classifier -> RAG Responder / Escalation
 """
 
-import os
-from typing import TypedDict, Literal
+import re
+import asyncio
+from typing import Any, AsyncIterator, TypedDict, Literal, Optional
 from enum import Enum
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig
 
-from rag_chain import get_rag_chain
+from rag_chain import get_rag_chain, require_api_key
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +29,46 @@ class QueryCategory(str, Enum):
     ESCALATE = "ESCALATE"
 
 
+_VALID_CATEGORIES = frozenset(cat.value for cat in QueryCategory)
+
+# Keyword rules for obvious queries, tried in order before falling back to the LLM.
+# ESCALATE goes first so a complaint that also mentions a refund still escalates.
+# Every rule matches an explicit intent phrase; bare words like "manager", "return"
+# or "hours" also appear in product questions, so those are left to the LLM.
+_KEYWORD_RULES = (
+    (
+        re.compile(
+            r"\b((speak|talk)\s+(to|with)\s+(a|the|your)\s+(manager|supervisor)"
+            r"|(file|make|lodge)\s+a\s+(formal\s+)?complaint"
+            r"|lawsuit|furious)\b",
+            re.I,
+        ),
+        QueryCategory.ESCALATE.value,
+    ),
+    (
+        re.compile(
+            r"\b((return|exchange|refund)\s+(this|that|it|my|the|an?)\b"
+            r"|(returns?|refund|exchange)\s+polic(y|ies)"
+            r"|(get|want|need|request)\s+(a|my)\s+refund"
+            r"|warranty\s+claim|claim\s+(the|my)\s+warranty"
+            r"|cancel\w*\s+(my\s+|the\s+|an?\s+)?order)",
+            re.I,
+        ),
+        QueryCategory.RETURNS.value,
+    ),
+    (
+        re.compile(
+            r"\b((store|opening|business)\s+hours"
+            r"|store\s+locations?|where\s+(is|are)\s+your\s+(store|shop)s?"
+            r"|shipping\s+(costs?|fees?|times?|options?|polic(y|ies))"
+            r"|payment\s+(methods?|options?))\b",
+            re.I,
+        ),
+        QueryCategory.GENERAL.value,
+    ),
+)
+
+
 class AgentState(TypedDict):
     """State object passed through the LangGraph workflow."""
     input: str                    # Original user query
@@ -62,67 +104,95 @@ I'm connecting you with one of our customer support specialists who can help you
 Thank you for your patience. Is there anything else I can help you with in the meantime?"""
 
 
+# Singleton classifier LLM
+_classifier_llm = None
+
+
 def get_classifier_llm():
     """Get the LLM for classification (lightweight, fast responses)."""
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=os.getenv("GOOGLE_API_KEY"),
-        temperature=0,
-        max_tokens=20,
-    )
+    global _classifier_llm
+    if _classifier_llm is None:
+        _classifier_llm = ChatGoogleGenerativeAI(
+            model="gemini-2.0-flash",
+            google_api_key=require_api_key(),
+            temperature=0,
+            max_tokens=20,
+        )
+    return _classifier_llm
+
+
+# Singleton classifier chain
+_classifier_chain = None
+
 
+def get_classifier_chain():
+    """Get the classifier prompt | LLM | parser chain (singleton)."""
+    global _classifier_chain
+    if _classifier_chain is None:
+        prompt = ChatPromptTemplate.from_template(CLASSIFIER_PROMPT)
+        _classifier_chain = prompt | get_classifier_llm() | StrOutputParser()
+    return _classifier_chain
+
+
+def classify_by_keywords(query: str) -> Optional[str]:
+    """Classify obvious queries by keyword, or return None if ambiguous."""
+    for pattern, category in _KEYWORD_RULES:
+        if pattern.search(query):
+            return category
+    return None
+
+
+async def aclassify_query(query: str) -> str:
+    """Classify a query, trying the keyword fast path before the LLM."""
+    result = classify_by_keywords(query)
+    
+    if result is None:
+        result = (await get_classifier_chain().ainvoke({"query": query})).strip().upper()
+        
+        # Validate and normalize category
+        if result not in _VALID_CATEGORIES:
+            # Default to GENERAL if classification is unclear
+            result = QueryCategory.GENERAL.value
+    
+    return result
 
-def classifier_node(state: AgentState) -> AgentState:
+
+async def classifier_node(state: AgentState) -> dict:
     """
     Node 1: Classify the user query into a category.
     Categories: PRODUCTS, RETURNS, GENERAL, ESCALATE
     """
-    query = state["input"]
-    
-    llm = get_classifier_llm()
-    prompt = ChatPromptTemplate.from_template(CLASSIFIER_PROMPT)
-    chain = prompt | llm | StrOutputParser()
-    
-    # Get classification
-    result = chain.invoke({"query": query}).strip().upper()
-    
-    # Validate and normalize category
-    valid_categories = {cat.value for cat in QueryCategory}
-    if result not in valid_categories:
-        # Default to GENERAL if classification is unclear
-        result = QueryCategory.GENERAL.value
+    result = await aclassify_query(state["input"])
     
     return {
-        **state,
         "category": result,
         "needs_escalation": result == QueryCategory.ESCALATE.value
     }
 
 
-def rag_responder_node(state: AgentState) -> AgentState:
+async def rag_responder_node(state: AgentState, config: RunnableConfig) -> dict:
     """
     Node 2: Use RAG to generate a response based on the knowledge base.
     Handles PRODUCTS, RETURNS (policy info), and GENERAL queries.
+    The node config is passed on so graph.astream() can stream the LLM tokens.
     """
     query = state["input"]
     
-    # Get RAG chain and generate response
+    # Get RAG chain and generate response (repeat questions hit its response cache)
     rag = get_rag_chain()
-    response = rag.invoke(query)
+    response = await rag.ainvoke(query, config=config)
     
     return {
-        **state,
         "response": response
     }
 
 
-def escalation_node(state: AgentState) -> AgentState:
+def escalation_node(state: AgentState) -> dict:
     """
     Node 3: Handle escalation for complex issues or complaints.
     Returns a message indicating human support will be provided.
     """
     return {
-        **state,
         "response": ESCALATION_MESSAGE,
         "needs_escalation": True
     }
@@ -196,9 +266,50 @@ def get_compiled_graph():
     return _compiled_graph
 
 
-def process_query(query: str) -> dict:
+def _initial_state(query: str) -> AgentState:
+    """Build the workflow's starting state for a query."""
+    return {
+        "input": query,
+        "category": "",
+        "response": "",
+        "needs_escalation": False
+    }
+
+
+async def astream_query(query: str) -> AsyncIterator[Any]:
     """
-    Process a customer query through the workflow.
+    Stream a customer query through the compiled workflow.
+    
+    Args:
+        query: The customer's question or message
+        
+    Yields:
+        First the classifier's state update (dict with category and
+        needs_escalation), then the response text: RAG tokens as they are
+        generated, or the whole response when a node returns it without
+        calling the LLM (escalations and cached answers)
+    """
+    graph = get_compiled_graph()
+    streamed = False
+    
+    async for mode, payload in graph.astream(_initial_state(query), stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") == "rag_responder" and chunk.content:
+                streamed = True
+                yield chunk.content
+            continue
+        
+        for node, update in payload.items():
+            if node == "classifier":
+                yield update
+            elif not streamed and update.get("response"):
+                yield update["response"]
+
+
+async def aprocess_query(query: str) -> dict:
+    """
+    Process a customer query through the workflow asynchronously.
     
     Args:
         query: The customer's question or message
@@ -208,20 +319,27 @@ def process_query(query: str) -> dict:
     """
     graph = get_compiled_graph()
     
-    # Initialize state
-    initial_state: AgentState = {
-        "input": query,
-        "category": "",
-        "response": "",
-        "needs_escalation": False
-    }
-    
     # Run the workflow
-    result = graph.invoke(initial_state)
+    result = await graph.ainvoke(_initial_state(query))
     
     return result
 
 
+def process_query(query: str) -> dict:
+    """
+    Process a customer query through the workflow.
+    Synchronous wrapper around aprocess_query for scripts; not for use
+    inside a running event loop.
+    
+    Args:
+        query: The customer's question or message
+        
+    Returns:
+        dict with keys: input, category, response, needs_escalation
+    """
+    return asyncio.run(aprocess_query(query))
+
+
 # For testing
 if __name__ == "__main__":
     print("Testing LangGraph Workflow...")
@@ -235,14 +353,22 @@ if __name__ == "__main__":
         "My earbuds are not connecting to my phone",                 # PRODUCTS (troubleshooting)
     ]
     
-    for query in test_queries:
+    # Run all queries concurrently on one event loop (also exercises the shared singletons)
+    async def run_tests():
+        return await asyncio.gather(
+            *(aprocess_query(query) for query in test_queries),
+            return_exceptions=True
+        )
+    
+    results = asyncio.run(run_tests())
+    
+    for query, result in zip(test_queries, results):
         print(f"\nQuery: {query}")
         print("-" * 40)
-        try:
-            result = process_query(query)
+        if isinstance(result, Exception):
+            print(f"Error: {result}")
+        else:
             print(f"Category: {result['category']}")
             print(f"Escalated: {result['needs_escalation']}")
             print(f"Response: {result['response'][:200]}...")
-        except Exception as e:
-            print(f"Error: {e}")
         print()
@@ -5,23 +5,78 @@ using Google Gemini and ChromaDB for context-aware responses.
 """
 
 import os
-from typing import Optional
+import math
+import time
+import uuid
+import asyncio
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count, cycle
+from functools import cache, lru_cache
+from types import ModuleType
+from typing import AsyncIterator, Iterator, Optional
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+
+# Chroma's telemetry and the tokenizers thread pool are pure overhead here
+# (embeddings come from Gemini); set before any Chroma/LangChain import
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from langchain_core.embeddings import Embeddings
 
 # Load environment variables
 load_dotenv()
 
+
+@cache
+def _lazy(name: str) -> ModuleType:
+    """
+    Import a module on first use.
+    The Gemini and Chroma integrations pull in gRPC, protobuf and onnxruntime,
+    so they are only imported once the chain is actually built.
+    """
+    return importlib.import_module(name)
+
+
 # Configuration
+# Single source of the API key for all modules; read it as rag_chain.GOOGLE_API_KEY
+# (or via require_api_key()) at call time so tests can monkeypatch it here.
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 CHROMA_PATH = "chroma_db"
+CHROMA_HOST = os.getenv("CHROMA_HOST")  # Set to use a shared Chroma server instead of CHROMA_PATH
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# Number of Gemini LLM clients (each with its own connection) used round-robin
+GEMINI_CHANNEL_POOL_SIZE = max(1, int(os.getenv("GEMINI_CHANNEL_POOL_SIZE", "1")))
 COLLECTION_NAME = "techgear_products"
+# HNSW settings applied when the collection is created (by ingest.py).
+# M and construction_ef are paid once at build time for better graph quality;
+# search_ef trades query latency for recall; change it later with set_search_ef().
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIMENSIONS = 256  # Reduced (Matryoshka) output size; changing it requires a re-ingest
+EMBEDDING_CACHE_MAX_SIZE = 10_000
+RETRIEVAL_K = 3           # Chunks passed to the LLM
+MMR_FETCH_K_FACTOR = 5    # Candidates fetched per returned chunk for MMR
+MMR_LAMBDA = 0.5          # 1 = pure relevance, 0 = pure diversity
+MAX_CONTEXT_TOKENS = 2048  # Upper bound on the context placed in the prompt
+SMALLTALK_THRESHOLD = 0.8  # Cosine similarity to the small-talk centroid that skips retrieval
+RESPONSE_CACHE_COLLECTION = "response_cache"
+RESPONSE_CACHE_MAX_DISTANCE = 0.05         # Cosine distance, i.e. similarity >= 0.95
+RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+RESPONSE_CACHE_PURGE_INTERVAL = 100        # Inserts between purges of expired entries
 
-# System prompt for the support agent
-SYSTEM_PROMPT = """You are a helpful and friendly customer support agent for TechGear Electronics.
+# System prompt for the support agent.
+# Kept static and byte-identical across calls so Gemini's implicit prompt
+# caching can reuse the prefix; never format per-request data into it.
+STATIC_SYSTEM = """You are a helpful and friendly customer support agent for TechGear Electronics.
 Your role is to assist customers with their product inquiries, technical support questions, and general information.
 
 Guidelines:
@@ -30,90 +85,510 @@ Guidelines:
 - If the information is not in the context, say you don't have that specific information and suggest contacting support
 - Include relevant product details like prices, features, and SKUs when available
 - For troubleshooting, provide clear step-by-step instructions
-- Keep responses concise but comprehensive
+- Keep responses concise but comprehensive"""
 
-Context from knowledge base:
+# Exemplars of chit-chat that needs no knowledge-base context
+SMALLTALK_EXAMPLES = [
+    "hi", "hello", "hey there", "good morning", "good evening",
+    "how are you?", "thanks", "thank you so much", "thanks for your help",
+    "ok", "okay, got it", "great", "cool", "bye", "goodbye",
+    "see you later", "have a nice day", "who are you?", "are you a bot?",
+    "nice to meet you",
+]
+
+# Per-request content goes in the user turn, after the cached prefix
+USER_TEMPLATE = """Context from knowledge base:
 {context}
 
-Customer Query: {question}
+Customer Query: {question}"""
+
+
+class NormalizedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that L2-normalizes each vector.
+    Gemini only returns unit vectors at full size; reduced-dimension
+    (Matryoshka) output has to be renormalized before cosine/MMR scoring.
+    """
+    
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+    
+    @staticmethod
+    def _normalize(vector: list[float]) -> list[float]:
+        norm = math.hypot(*vector) or 1.0
+        return [x / norm for x in vector]
+    
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query and normalize the vector."""
+        return self._normalize(self.inner.embed_query(text))
+    
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents and normalize the vectors."""
+        return [self._normalize(vector) for vector in self.inner.embed_documents(texts)]
+
+
+def create_embeddings(api_key: Optional[str]) -> NormalizedEmbeddings:
+    """Create the Gemini embedding model used for both ingestion and retrieval."""
+    genai = _lazy("langchain_google_genai")
+    return NormalizedEmbeddings(genai.GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=api_key,
+        output_dimensionality=EMBEDDING_DIMENSIONS
+    ))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-memory LRU cache.
+    Keys are a blake2b digest of the whitespace-collapsed, lowercased text,
+    so repeated or trivially different queries skip the embedding API call.
+    Queries and documents are cached separately since the model embeds
+    them with different task types.
+    """
+    
+    def __init__(self, inner: Embeddings, max_size: int = EMBEDDING_CACHE_MAX_SIZE):
+        self.inner = inner
+        self.max_size = max_size
+        self._cache: "OrderedDict[bytes, list[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(kind: bytes, text: str) -> bytes:
+        normalized = " ".join(text.split()).lower()
+        return kind + hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+    
+    def _get(self, key: bytes) -> Optional[list[float]]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+    
+    def _put(self, key: bytes, vector: list[float]):
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+    
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, reusing a cached vector when available."""
+        key = self._key(b"q", text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self._put(key, vector)
+        return vector
+    
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, only sending uncached texts to the API."""
+        keys = [self._key(b"d", text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.inner.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self._put(keys[i], vector)
+        return vectors
+
+
+def chroma_client_settings():
+    """Get Chroma client settings with anonymous telemetry disabled."""
+    return _lazy("chromadb.config").Settings(anonymized_telemetry=False)
+
+
+@cache
+def _token_encoding():
+    """
+    Get the tiktoken encoding used to budget context tokens, or None.
+    cl100k_base is close enough to Gemini's tokenizer for budgeting;
+    without tiktoken, or when its encoding file cannot be downloaded
+    (e.g. offline), ~4 characters per token is assumed.
+    """
+    try:
+        return importlib.import_module("tiktoken").get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens."""
+    encoding = _token_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
 
-Response:"""
+def require_api_key() -> str:
+    """Get GOOGLE_API_KEY, failing fast with a clear error if it is missing."""
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+    return GOOGLE_API_KEY
+
+
+def create_chroma_client():
+    """
+    Create a client for the shared Chroma server when CHROMA_HOST is set.
+    Returns None otherwise, meaning the embedded store in CHROMA_PATH is used.
+    A server lets all API workers share one loaded HNSW index instead of
+    each loading its own copy.
+    """
+    if not CHROMA_HOST:
+        return None
+    chromadb = _lazy("chromadb")
+    return chromadb.HttpClient(
+        host=CHROMA_HOST,
+        port=CHROMA_PORT,
+        settings=chroma_client_settings()
+    )
+
+
+def set_search_ef(
+    ef_search: int,
+    chroma_path: str = CHROMA_PATH,
+    collection_name: str = COLLECTION_NAME,
+):
+    """
+    Change the HNSW ef_search of the product collection.
+    This is an admin operation, not a per-request setting: the value is stored
+    with the collection, so it persists across restarts and applies to every
+    worker using the same store. Higher values raise recall at a roughly linear
+    latency cost; no re-ingest is needed.
+    """
+    client = create_chroma_client()
+    if client is None:
+        client = _lazy("chromadb").PersistentClient(
+            path=chroma_path,
+            settings=chroma_client_settings()
+        )
+    client.get_collection(collection_name).modify(
+        configuration={"hnsw": {"ef_search": ef_search}}
+    )
+
+
+@lru_cache(maxsize=None)
+def _shared_embeddings(api_key: Optional[str]) -> CachedEmbeddings:
+    """Get one cached embeddings client per API key, shared by all RAGChain instances."""
+    return CachedEmbeddings(create_embeddings(api_key))
 
 
 class RAGChain:
     """RAG Chain for TechGear Electronics customer support."""
     
-    def __init__(self, chroma_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME):
-        """Initialize the RAG chain with ChromaDB and Gemini."""
+    _SEP = "\n\n---\n\n"  # Separator between context chunks
+    
+    def __init__(
+        self,
+        chroma_path: str = CHROMA_PATH,
+        collection_name: str = COLLECTION_NAME,
+    ):
+        """
+        Initialize the RAG chain with ChromaDB and Gemini.
+        
+        Args:
+            chroma_path: Directory of the embedded ChromaDB store
+            collection_name: Collection holding the knowledge base
+        """
         self.chroma_path = chroma_path
         self.collection_name = collection_name
         self._vectorstore = None
         self._retriever = None
         self._chain = None
         self._llm = None
+        self._embeddings = None
+        self._response_cache = None
+        self._smalltalk_centroid = None
+        self._llm_clients = []
+        self._response_cache_inserts = count(1)  # next() is atomic, safe across threads
+        # Guards the lazy initializers below; reentrant since they call each other
+        self._init_lock = threading.RLock()
         
     def _get_embeddings(self):
-        """Get the embedding model."""
-        return GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
+        """Get the embedding model, wrapped in a query/document cache."""
+        if self._embeddings is None:
+            with self._init_lock:
+                if self._embeddings is None:
+                    self._embeddings = _shared_embeddings(require_api_key())
+        return self._embeddings
+    
+    def _create_llm(self):
+        """Create a Gemini LLM client."""
+        genai = _lazy("langchain_google_genai")
+        return genai.ChatGoogleGenerativeAI(
+            model="gemini-2.0-flash",
+            google_api_key=require_api_key(),
+            temperature=0.3,
+            max_tokens=1024
         )
     
     def _get_llm(self):
-        """Get the Gemini LLM."""
+        """
+        Get the Gemini LLM.
+        With GEMINI_CHANNEL_POOL_SIZE > 1 this is a runnable that hands each
+        call to the next client in a pool, spreading concurrent requests over
+        several connections instead of one connection's stream limit.
+        """
         if self._llm is None:
-            self._llm = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash",
-                google_api_key=os.getenv("GOOGLE_API_KEY"),
-                temperature=0.3,
-                max_tokens=1024,
-            )
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm_clients = [self._create_llm() for _ in range(GEMINI_CHANNEL_POOL_SIZE)]
+                    if GEMINI_CHANNEL_POOL_SIZE == 1:
+                        self._llm = self._llm_clients[0]
+                    else:
+                        clients = cycle(self._llm_clients)
+                        # A RunnableLambda that returns a runnable invokes it with the same input
+                        self._llm = _lazy("langchain_core.runnables").RunnableLambda(lambda _: next(clients))
         return self._llm
     
     def get_vectorstore(self):
         """Get or create the ChromaDB vector store."""
         if self._vectorstore is None:
-            embeddings = self._get_embeddings()
-            self._vectorstore = Chroma(
-                persist_directory=self.chroma_path,
-                embedding_function=embeddings,
-                collection_name=self.collection_name
-            )
+            with self._init_lock:
+                if self._vectorstore is None:
+                    embeddings = self._get_embeddings()
+                    self._vectorstore = _lazy("langchain_chroma").Chroma(
+                        client=create_chroma_client(),
+                        client_settings=chroma_client_settings(),
+                        persist_directory=self.chroma_path,
+                        embedding_function=embeddings,
+                        collection_name=self.collection_name,
+                        collection_metadata=COLLECTION_METADATA
+                    )
         return self._vectorstore
     
-    def get_retriever(self, k: int = 4):
-        """Get the retriever from the vector store."""
+    def get_retriever(self, k: int = RETRIEVAL_K):
+        """Get the (MMR) retriever from the vector store."""
         if self._retriever is None:
-            vectorstore = self.get_vectorstore()
-            self._retriever = vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": k}
-            )
+            with self._init_lock:
+                if self._retriever is None:
+                    vectorstore = self.get_vectorstore()
+                    self._retriever = vectorstore.as_retriever(
+                        search_type="mmr",
+                        search_kwargs={"k": k, "fetch_k": MMR_FETCH_K_FACTOR * k, "lambda_mult": MMR_LAMBDA}
+                    )
         return self._retriever
     
-    def _format_docs(self, docs) -> str:
-        """Format retrieved documents into a single context string."""
-        return "\n\n---\n\n".join(doc.page_content for doc in docs)
+    def _query_documents(self, query: str, k: int = RETRIEVAL_K) -> list[str]:
+        """
+        Retrieve the text of k relevant, mutually diverse chunks for a query.
+        Queries the underlying Chroma collection directly for MMR_FETCH_K_FACTOR * k
+        candidates, then picks k of them with maximal marginal relevance, so
+        near-duplicate chunks do not crowd the prompt.
+        """
+        embedding = self._get_embeddings().embed_query(query)
+        result = self.get_vectorstore()._collection.query(
+            query_embeddings=[embedding],
+            n_results=MMR_FETCH_K_FACTOR * k,
+            include=["documents", "embeddings"]
+        )
+        texts = result["documents"][0]
+        if len(texts) <= k:
+            return texts
+        
+        np = _lazy("numpy")
+        mmr = _lazy("langchain_core.vectorstores.utils").maximal_marginal_relevance
+        selected = mmr(
+            np.array(embedding, dtype=np.float32),
+            result["embeddings"][0],
+            k=k,
+            lambda_mult=MMR_LAMBDA
+        )
+        return [texts[i] for i in selected]
+    
+    def _get_smalltalk_centroid(self):
+        """Get the normalized mean embedding of SMALLTALK_EXAMPLES (computed once)."""
+        if self._smalltalk_centroid is None:
+            with self._init_lock:
+                if self._smalltalk_centroid is None:
+                    np = _lazy("numpy")
+                    embeddings = self._get_embeddings()
+                    # Embedded as queries, to match the vectors they are compared with
+                    with ThreadPoolExecutor(max_workers=8) as executor:
+                        vectors = np.array(list(executor.map(embeddings.embed_query, SMALLTALK_EXAMPLES)))
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    self._smalltalk_centroid = centroid / np.linalg.norm(centroid)
+        return self._smalltalk_centroid
+    
+    def _is_smalltalk(self, embedding: list[float]) -> bool:
+        """Check whether a query embedding is close to the small-talk centroid."""
+        np = _lazy("numpy")
+        vector = np.asarray(embedding)
+        similarity = float(vector @ self._get_smalltalk_centroid()) / float(np.linalg.norm(vector))
+        return similarity > SMALLTALK_THRESHOLD
+    
+    def _build_context(self, query: str) -> str:
+        """
+        Retrieve and format the prompt context for a query.
+        Small talk ("hi", "thanks") gets an empty context without touching Chroma.
+        """
+        embedding = self._get_embeddings().embed_query(query)
+        if self._is_smalltalk(embedding):
+            return ""
+        return self._format_docs(self._query_documents(query))
+    
+    def _format_docs(self, texts: list[str], max_context_tokens: int = MAX_CONTEXT_TOKENS) -> str:
+        """
+        Format retrieved document texts into a single context string.
+        Each text is cut to an equal share of max_context_tokens, so prompt
+        (and prefill) size stays bounded whatever the chunker produced.
+        """
+        if not texts:
+            return ""
+        per_doc = max_context_tokens // len(texts)
+        return self._SEP.join(_truncate_tokens(text, per_doc) for text in texts)
     
     def get_chain(self):
         """Build and return the RAG chain."""
         if self._chain is None:
-            retriever = self.get_retriever()
-            llm = self._get_llm()
+            with self._init_lock:
+                if self._chain is None:
+                    llm = self._get_llm()
             
-            prompt = ChatPromptTemplate.from_template(SYSTEM_PROMPT)
+                    prompts = _lazy("langchain_core.prompts")
+                    output_parsers = _lazy("langchain_core.output_parsers")
+                    runnables = _lazy("langchain_core.runnables")
             
-            self._chain = (
-                {
-                    "context": retriever | self._format_docs,
-                    "question": RunnablePassthrough()
-                }
-                | prompt
-                | llm
-                | StrOutputParser()
-            )
+                    prompt = prompts.ChatPromptTemplate.from_messages([
+                        ("system", STATIC_SYSTEM),
+                        ("user", USER_TEMPLATE),
+                    ])
+            
+                    # Retrieval, formatting and prompt assembly in a single step,
+                    # instead of a RunnableMap fanning out to two branches per call
+                    def assemble(query: str):
+                        return prompt.format_messages(context=self._build_context(query), question=query)
+            
+                    async def aassemble(query: str):
+                        context = await asyncio.to_thread(self._build_context, query)
+                        return prompt.format_messages(context=context, question=query)
+            
+                    self._chain = (
+                        runnables.RunnableLambda(assemble, afunc=aassemble)
+                        | llm
+                        | output_parsers.StrOutputParser()
+                    )
         return self._chain
     
+    def _get_response_cache(self):
+        """
+        Get the Chroma collection used as a semantic response cache.
+        It lives in a per-process in-memory client, so serving never writes
+        to the embedded knowledge-base store and a restart starts fresh;
+        with CHROMA_HOST it is shared on the server, where ingest.py drops it
+        whenever the product collection is rewritten.
+        """
+        if self._response_cache is None:
+            with self._init_lock:
+                if self._response_cache is None:
+                    if CHROMA_HOST:
+                        client = self.get_vectorstore()._client
+                    else:
+                        client = _lazy("chromadb").EphemeralClient(settings=chroma_client_settings())
+                    self._response_cache = client.get_or_create_collection(
+                        name=RESPONSE_CACHE_COLLECTION,
+                        metadata={"hnsw:space": "cosine"}
+                    )
+        return self._response_cache
+    
+    def _lookup_response(self, embedding: list[float]) -> Optional[str]:
+        """Return a fresh cached response for a near-identical query, if any."""
+        try:
+            result = self._get_response_cache().query(
+                query_embeddings=[embedding],
+                n_results=1,
+                include=["metadatas", "distances"]
+            )
+        except Exception:
+            # Dropped by a re-ingest; recreated empty on next use
+            self._response_cache = None
+            return None
+        if not result["ids"][0]:
+            return None
+        
+        metadata = result["metadatas"][0][0]
+        if result["distances"][0][0] > RESPONSE_CACHE_MAX_DISTANCE:
+            return None
+        if metadata["inserted_at"] < time.time() - RESPONSE_CACHE_TTL_SECONDS:
+            return None
+        return metadata["response"]
+    
+    def _store_response(self, query: str, embedding: list[float], response: str):
+        """Cache a response, periodically purging expired entries."""
+        if not response:
+            return
+        cache = self._get_response_cache()
+        try:
+            cache.add(
+                ids=[str(uuid.uuid4())],
+                embeddings=[embedding],
+                documents=[query],
+                metadatas=[{"response": response, "inserted_at": time.time()}]
+            )
+        except Exception:
+            # Dropped by a re-ingest; recreated empty on next use
+            self._response_cache = None
+            return
+        
+        if next(self._response_cache_inserts) % RESPONSE_CACHE_PURGE_INTERVAL == 0:
+            cache.delete(where={"inserted_at": {"$lt": time.time() - RESPONSE_CACHE_TTL_SECONDS}})
+    
+    def _cached_lookup(self, query: str) -> tuple[list[float], Optional[str]]:
+        """Embed a query and look it up in the response cache."""
+        embedding = self._get_embeddings().embed_query(query)
+        return embedding, self._lookup_response(embedding)
+    
+    def stream(self, query: str) -> Iterator[str]:
+        """
+        Stream the response to a query as it is generated.
+        Answers to near-identical earlier queries are served whole from the
+        semantic response cache, skipping retrieval and generation.
+        
+        Args:
+            query: The user's question or inquiry
+            
+        Yields:
+            Response text chunks, in order
+        """
+        embedding, cached = self._cached_lookup(query)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        for chunk in self.get_chain().stream(query):
+            chunks.append(chunk)
+            yield chunk
+        self._store_response(query, embedding, "".join(chunks))
+    
+    async def astream(self, query: str, config: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Stream the response to a query asynchronously.
+        Uses the same semantic response cache as stream().
+        
+        Args:
+            query: The user's question or inquiry
+            config: Optional runnable config (callbacks, tags) for the chain run,
+                e.g. the LangGraph node config so the graph can stream tokens
+            
+        Yields:
+            Response text chunks, in order
+        """
+        embedding, cached = await asyncio.to_thread(self._cached_lookup, query)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        async for chunk in self.get_chain().astream(query, config=config):
+            chunks.append(chunk)
+            yield chunk
+        await asyncio.to_thread(self._store_response, query, embedding, "".join(chunks))
+    
     def invoke(self, query: str) -> str:
         """
         Process a query through the RAG chain.
@@ -124,11 +599,80 @@ class RAGChain:
         Returns:
             The generated response from the RAG chain
         """
-        chain = self.get_chain()
-        response = chain.invoke(query)
-        return response
+        return "".join(self.stream(query))
+    
+    def batch_invoke(
+        self,
+        queries: list[str],
+        max_concurrency: int = 8,
+        return_exceptions: bool = False,
+    ) -> list:
+        """
+        Process several queries through the RAG chain concurrently.
+        Each query goes through invoke(), so the response cache applies.
+        
+        Args:
+            queries: The user questions to answer
+            max_concurrency: Maximum number of queries in flight at once
+            return_exceptions: Return a failed query's exception in its slot
+                instead of raising it
+            
+        Returns:
+            The generated responses (or exceptions), in the same order as the queries
+        """
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = [executor.submit(self.invoke, query) for query in queries]
+        if not return_exceptions:
+            return [future.result() for future in futures]
+        return [future.exception() or future.result() for future in futures]
+    
+    async def ainvoke(self, query: str, config: Optional[dict] = None) -> str:
+        """
+        Process a query through the RAG chain asynchronously.
+        
+        Args:
+            query: The user's question or inquiry
+            config: Optional runnable config passed on to astream()
+            
+        Returns:
+            The generated response from the RAG chain
+        """
+        return "".join([chunk async for chunk in self.astream(query, config)])
     
-    def retrieve_context(self, query: str, k: int = 4) -> list:
+    async def abatch(self, queries: list[str], max_concurrency: int = 8) -> list[str]:
+        """
+        Process several queries through the RAG chain asynchronously.
+        Each query goes through ainvoke(), so the response cache applies.
+        
+        Args:
+            queries: The user questions to answer
+            max_concurrency: Maximum number of queries in flight at once
+            
+        Returns:
+            The generated responses, in the same order as the queries
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(query: str) -> str:
+            async with semaphore:
+                return await self.ainvoke(query)
+        
+        return await asyncio.gather(*(run(query) for query in queries))
+    
+    def warm_up(self):
+        """
+        Initialize everything the first request would otherwise pay for:
+        builds the chain, loads the Chroma index, computes the small-talk
+        centroid and opens the embedding connection and the connection of
+        every pooled LLM client.
+        """
+        self.get_chain()
+        self._query_documents("warm-up")
+        self._get_smalltalk_centroid()
+        with ThreadPoolExecutor(max_workers=len(self._llm_clients)) as executor:
+            list(executor.map(lambda client: client.invoke("ping"), self._llm_clients))
+    
+    def retrieve_context(self, query: str, k: int = RETRIEVAL_K) -> list:
         """
         Retrieve relevant context without generating a response.
         Useful for debugging or inspecting retrieved documents.
@@ -146,16 +690,24 @@ class RAGChain:
 
 # Create a singleton instance for use across the application
 _rag_chain_instance: Optional[RAGChain] = None
+_rag_chain_lock = threading.Lock()
 
 
 def get_rag_chain() -> RAGChain:
     """Get or create the RAG chain singleton instance."""
     global _rag_chain_instance
     if _rag_chain_instance is None:
-        _rag_chain_instance = RAGChain()
+        with _rag_chain_lock:
+            if _rag_chain_instance is None:
+                _rag_chain_instance = RAGChain()
     return _rag_chain_instance
 
 
+def warm_up_rag_chain():
+    """Warm up the RAG chain singleton (see RAGChain.warm_up)."""
+    get_rag_chain().warm_up()
+
+
 def query_rag(question: str) -> str:
     """
     Convenience function to query the RAG chain.
@@ -184,12 +736,13 @@ if __name__ == "__main__":
     
     rag = get_rag_chain()
     
-    for query in test_queries:
+    responses = rag.batch_invoke(test_queries, return_exceptions=True)
+    
+    for query, response in zip(test_queries, responses):
         print(f"\nQuery: {query}")
         print("-" * 40)
-        try:
-            response = rag.invoke(query)
+        if isinstance(response, Exception):
+            print(f"Error: {response}")
+        else:
             print(f"Response: {response}")
-        except Exception as e:
-            print(f"Error: {e}")
         print()